@@ -0,0 +1,289 @@
+# admission.py
+import heapq
+import math
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+DB_PATH = "coffee.db"
+
+# Kitchen capacity: how many drinks are made at once and roughly how long each takes
+KITCHEN_PARALLELISM = 2
+PREP_SECONDS_PER_ORDER = 90
+# "Now" orders are turned away once this many orders are pending/preparing
+MAX_ACTIVE_ORDERS = 20
+# Scheduled orders due within this many seconds are treated like "Now" orders
+SCHEDULE_HORIZON = 15 * 60
+# Further-out scheduled orders are capped per pickup slot instead
+SLOT_SECONDS = 15 * 60
+SCHEDULED_PER_SLOT = 8
+
+# Token buckets: (burst size, refill per second)
+SRN_BUCKET = (2, 1 / 60)
+GLOBAL_BUCKET = (10, 0.5)
+
+ACTIVE_STATUSES = ("pending", "preparing")
+
+
+class TokenBucket:
+    def __init__(self, capacity, refill_rate, clock=time.monotonic):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def has_token(self):
+        self._refill()
+        return self.tokens >= 1
+
+    def take(self):
+        self.tokens -= 1
+
+    def full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+@dataclass
+class Admission:
+    admitted: bool
+    # Epoch seconds: the estimated pickup when admitted, otherwise the time to suggest
+    at: float
+    reason: str = ""
+
+
+def ceil_to(t, step):
+    return math.ceil(t / step) * step
+
+
+class AdmissionController:
+    """Sits in front of place_order. Keeps the pending/preparing orders in memory
+    so every kiosk submit doesn't have to run a COUNT(*).
+
+    Orders due within SCHEDULE_HORIZON are in the kitchen queue (self.active) and
+    count towards MAX_ACTIVE_ORDERS. Orders scheduled further out are held in
+    self.deferred, capped per pickup slot, and join the queue when their slot
+    comes within the horizon."""
+
+    def __init__(self, orders=(), max_active=MAX_ACTIVE_ORDERS, per_slot=SCHEDULED_PER_SLOT,
+                 srn_bucket=SRN_BUCKET, global_bucket=GLOBAL_BUCKET, clock=time.monotonic,
+                 wall_clock=time.time):
+        self.max_active = max_active
+        self.per_slot = per_slot
+        self.srn_bucket = srn_bucket
+        # Token buckets run on the monotonic clock; pickup times and slots on the wall clock,
+        # so slots line up with the :00/:15/:30/:45 times the kiosk offers
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.global_bucket = TokenBucket(*global_bucket, clock=clock)
+        self.srn_buckets = {}
+        self.active = {}  # order_id -> None, kept in arrival order
+        self.deferred = {}  # order_id -> (pickup_at, slot)
+        self.due_heap = []
+        self.slots = {}  # slot -> number of deferred orders in it
+        self.lock = threading.Lock()
+        # Seed with (order_id, pickup epoch or None) for orders already in the DB
+        for order_id, pickup_at in orders:
+            self._add(order_id, pickup_at)
+
+    def wait_for(self, position):
+        # Seconds until the order at this queue position is ready
+        return math.ceil(position / KITCHEN_PARALLELISM) * PREP_SECONDS_PER_ORDER
+
+    def queue_depth(self):
+        with self.lock:
+            self._promote()
+            return len(self.active)
+
+    def admit(self, order_id, srn, pickup_at=None):
+        """Reserve a kitchen slot for order_id. pickup_at is the scheduled pickup as
+        epoch seconds, None for "Now". Call release() if the order isn't placed."""
+        with self.lock:
+            self._promote()
+            now = self.wall_clock()
+            deferred = self._is_deferred(pickup_at)
+
+            if deferred:
+                slot = int(pickup_at // SLOT_SECONDS)
+                if self.slots.get(slot, 0) >= self.per_slot:
+                    # Suggest the start of the next slot
+                    return Admission(False, (slot + 1) * SLOT_SECONDS, "slot_full")
+            elif len(self.active) >= self.max_active:
+                # Suggest the first slot after the queue has drained that is also past the
+                # horizon, so scheduling for it is taken as a scheduled order
+                drain = self.wait_for(len(self.active) - self.max_active + 1)
+                return Admission(False, ceil_to(now + max(drain, SCHEDULE_HORIZON), SLOT_SECONDS), "kitchen_busy")
+
+            bucket = self.srn_buckets.get(srn)
+            if bucket is None:
+                bucket = self.srn_buckets[srn] = TokenBucket(*self.srn_bucket, clock=self.clock)
+            if not bucket.has_token():
+                wait = (1 - bucket.tokens) / bucket.refill_rate
+                return Admission(False, ceil_to(now + wait, 60), "srn_limited")
+            if not self.global_bucket.has_token():
+                wait = (1 - self.global_bucket.tokens) / self.global_bucket.refill_rate
+                return Admission(False, ceil_to(now + wait, 60), "rush")
+
+            bucket.take()
+            self.global_bucket.take()
+            self._add(order_id, pickup_at)
+            self._prune()
+            if deferred:
+                return Admission(True, pickup_at)
+            return Admission(True, max(ceil_to(now + self.wait_for(len(self.active)), 60), pickup_at or 0))
+
+    def release(self, order_id):
+        with self.lock:
+            self._remove(order_id)
+
+    def on_status_change(self, order_id, old_status, new_status):
+        with self.lock:
+            if new_status not in ACTIVE_STATUSES:
+                self._remove(order_id)
+            elif new_status == "preparing" or old_status not in ACTIVE_STATUSES:
+                # The kitchen has started it, so it's in the queue whatever its pickup time
+                self._remove(order_id)
+                self.active[order_id] = None
+
+    def _is_deferred(self, pickup_at):
+        return pickup_at is not None and pickup_at - self.wall_clock() >= SCHEDULE_HORIZON
+
+    def _add(self, order_id, pickup_at):
+        if not self._is_deferred(pickup_at):
+            self.active[order_id] = None
+            return
+        slot = int(pickup_at // SLOT_SECONDS)
+        self.deferred[order_id] = (pickup_at, slot)
+        self.slots[slot] = self.slots.get(slot, 0) + 1
+        heapq.heappush(self.due_heap, (pickup_at, order_id))
+
+    def _remove(self, order_id):
+        self.active.pop(order_id, None)
+        entry = self.deferred.pop(order_id, None)
+        if entry:
+            self._free_slot(entry[1])
+
+    def _free_slot(self, slot):
+        self.slots[slot] -= 1
+        if not self.slots[slot]:
+            del self.slots[slot]
+
+    def _promote(self):
+        # Move deferred orders whose pickup is now within the horizon into the queue
+        horizon = self.wall_clock() + SCHEDULE_HORIZON
+        while self.due_heap and self.due_heap[0][0] <= horizon:
+            due, order_id = heapq.heappop(self.due_heap)
+            entry = self.deferred.get(order_id)
+            if entry and entry[0] == due:
+                del self.deferred[order_id]
+                self._free_slot(entry[1])
+                self.active[order_id] = None
+
+    def _prune(self):
+        # Drop buckets that have refilled, so the dict doesn't grow with every SRN ever seen
+        if len(self.srn_buckets) > 1000:
+            self.srn_buckets = {k: b for k, b in self.srn_buckets.items() if not b.full()}
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller(db_path=DB_PATH):
+    """Process-wide controller, shared by the kiosk and admin pages. Seeded once from the DB."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            try:
+                placeholders = ','.join(['?'] * len(ACTIVE_STATUSES))
+                rows = conn.execute(
+                    f"SELECT order_id, status, is_scheduled, scheduled_for FROM orders WHERE status IN ({placeholders})",
+                    ACTIVE_STATUSES,
+                ).fetchall()
+            except sqlite3.OperationalError:
+                rows = []
+            conn.close()
+
+            orders = []
+            for order_id, status, is_scheduled, scheduled_for in rows:
+                pickup_at = None
+                if is_scheduled and status == "pending":
+                    try:
+                        pickup_at = datetime.strptime(scheduled_for, "%Y-%m-%d %H:%M:%S").timestamp()
+                    except (TypeError, ValueError):
+                        pass
+                orders.append((order_id, pickup_at))
+            _controller = AdmissionController(orders)
+        return _controller
+
+
+def simulate(kiosks=60, breaks=4, break_gap=600, duration=3600, max_active=MAX_ACTIVE_ORDERS,
+             per_slot=SCHEDULED_PER_SLOT, global_bucket=GLOBAL_BUCKET, scheduled_share=0.5):
+    """Bursts of kiosk submits at each class break against a kitchen working at
+    KITCHEN_PARALLELISM orders per PREP_SECONDS_PER_ORDER. scheduled_share of the
+    kiosks pick "Schedule for Later", from the current quarter hour to an hour ahead.
+    Returns the stats."""
+    clock = [0.0]
+    ctl = AdmissionController(max_active=max_active, per_slot=per_slot, global_bucket=global_bucket,
+                              clock=lambda: clock[0], wall_clock=lambda: clock[0])
+    in_progress = {}  # order_id -> finish time
+    stats = {"admitted": 0, "rejected": 0, "scheduled_admitted": 0, "suggestion_busy_again": 0, "max_queue": 0}
+    scheduled_every = round(1 / scheduled_share) if scheduled_share else 0
+
+    for t in range(duration):
+        clock[0] = float(t)
+
+        # Kitchen finishes orders and starts the next ones in the queue
+        for order_id in [o for o, finish in in_progress.items() if finish <= t]:
+            del in_progress[order_id]
+            ctl.on_status_change(order_id, "preparing", "ready")
+        ctl.queue_depth()
+        for order_id in list(ctl.active):
+            if len(in_progress) >= KITCHEN_PARALLELISM:
+                break
+            if order_id not in in_progress:
+                in_progress[order_id] = t + PREP_SECONDS_PER_ORDER
+                ctl.on_status_change(order_id, "pending", "preparing")
+
+        # Everyone at the break submits within the first few seconds, retrying every 30s
+        if t % break_gap < 120 and t // break_gap < breaks and t % 30 < 3:
+            for k in range(kiosks // 3):
+                n = (t // break_gap) * kiosks + (t % 30) * (kiosks // 3) + k
+                pickup_at = None
+                if scheduled_every and k % scheduled_every == 0:
+                    # Quarter-hour times as the kiosk offers them, including the current one,
+                    # which must not dodge the queue limit
+                    pickup_at = (t // SLOT_SECONDS + (n * 7) % 5) * SLOT_SECONDS
+                result = ctl.admit(f"sim-{t}-{k}", f"SRN{n}", pickup_at)
+                if result.admitted:
+                    stats["admitted"] += 1
+                    stats["scheduled_admitted"] += pickup_at is not None
+                else:
+                    stats["rejected"] += 1
+                    if result.reason == "kitchen_busy":
+                        # Taking the "schedule for later" suggestion must not be turned away as busy again
+                        retry = ctl.admit(f"sim-{t}-{k}", f"SRN{n}", result.at)
+                        stats["suggestion_busy_again"] += retry.reason == "kitchen_busy"
+
+        stats["max_queue"] = max(stats["max_queue"], ctl.queue_depth())
+
+    return stats
+
+
+if __name__ == "__main__":
+    print("No admission control:", simulate(max_active=10 ** 9, per_slot=10 ** 9, global_bucket=(10 ** 9, 10 ** 9)))
+    result = simulate()
+    print("With admission control:", result)
+    # Deferred orders join the queue as their slot comes up. With SCHEDULED_PER_SLOT below what
+    # the kitchen gets through in a slot, that overshoots the walk-up limit by at most one slot's worth
+    bound = MAX_ACTIVE_ORDERS + SCHEDULED_PER_SLOT
+    print(f"Queue bound {bound}, worst queue seen {result['max_queue']}")
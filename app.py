@@ -7,6 +7,7 @@ from datetime import datetime
 import pandas as pd
 import razorpay
 from streamlit.components.v1 import html
+from admission import get_controller
 
 # --- CONFIGURATION ---
 DB_PATH = "coffee.db"
@@ -86,6 +87,8 @@ def init_db():
             FOREIGN KEY(order_id) REFERENCES orders(order_id)
         )
     """)
+    # Lets exports join items to their order without scanning the whole table
+    c.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id)")
     conn.commit()
     conn.close()
 
@@ -115,9 +118,26 @@ def verify_user(srn, password):
     return False
 
 def place_order(name, srn, items, scheduled_for=None):
-    if not items: return None, None, None, None
+    if not items: return None, None, None, None, None
 
     order_id = str(uuid.uuid4())[:8]
+
+    # ADMISSION CONTROL: don't hit the gateway or the DB if the kitchen is swamped
+    pickup_at = None
+    if scheduled_for:
+        pickup_at = datetime.strptime(scheduled_for, "%Y-%m-%d %H:%M:%S").timestamp()
+    admission = get_controller(DB_PATH).admit(order_id, srn, pickup_at)
+    # Suggested times are whole minutes (quarter hours for rescheduling), so HH:MM is exact
+    at = datetime.fromtimestamp(admission.at).strftime("%H:%M")
+    if not admission.admitted:
+        if admission.reason == "kitchen_busy":
+            st.warning(f"☕ The kitchen is at capacity. Try scheduling your order for {at} or later.")
+        elif admission.reason == "slot_full":
+            st.warning(f"That pickup time is fully booked. Please pick a time from {at} onwards.")
+        else:
+            st.warning(f"Too many orders right now. Please try again after {at}, or schedule for later.")
+        return None, None, None, None, None
+
     created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     completion_code = f"{random.randint(0, 9999):04d}"
     is_scheduled = 1 if scheduled_for else 0
@@ -135,26 +155,34 @@ def place_order(name, srn, items, scheduled_for=None):
         })
         razorpay_order_id = razorpay_order['id']
     except Exception as e:
+        get_controller(DB_PATH).release(order_id)
         st.error(f"Error connecting to Payment Gateway: {e}")
-        return None, None, None, None
+        return None, None, None, None, None
 
     conn = get_connection()
     c = conn.cursor()
-    # ORDER IS CREATED WITH STATUS 'pending'
-    c.execute("""
-        INSERT INTO orders (order_id, customer_name, srn, status, total, created_at, completion_code, is_scheduled, scheduled_for, razorpay_order_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (order_id, name, srn, "pending", total, created_at, completion_code, is_scheduled, scheduled_time, razorpay_order_id))
-
-    for item in items:
+    try:
+        # ORDER IS CREATED WITH STATUS 'pending'
         c.execute("""
-            INSERT INTO order_items (order_id, drink_name, size, qty, addons, line_total)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (order_id, item['name'], item['size'], item['qty'], item['addons'], item['line_total']))
-    conn.commit()
-    conn.close()
-
-    return order_id, completion_code, razorpay_order_id, total
+            INSERT INTO orders (order_id, customer_name, srn, status, total, created_at, completion_code, is_scheduled, scheduled_for, razorpay_order_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (order_id, name, srn, "pending", total, created_at, completion_code, is_scheduled, scheduled_time, razorpay_order_id))
+
+        for item in items:
+            c.execute("""
+                INSERT INTO order_items (order_id, drink_name, size, qty, addons, line_total)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (order_id, item['name'], item['size'], item['qty'], item['addons'], item['line_total']))
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        get_controller(DB_PATH).release(order_id)
+        st.error(f"Error saving your order: {e}")
+        return None, None, None, None, None
+    finally:
+        conn.close()
+
+    return order_id, completion_code, razorpay_order_id, total, at
 
 def get_orders_by_srn(srn):
     conn = get_connection()
@@ -274,7 +302,7 @@ def main():
                             else:
                                 create_user(srn, password)
 
-                        oid, code, rzp_oid, total = place_order(name, srn, cart_items, scheduled_time)
+                        oid, code, rzp_oid, total, pickup = place_order(name, srn, cart_items, scheduled_time)
 
                         if oid:
                             st.session_state.payment_step = True
@@ -284,7 +312,8 @@ def main():
                                 "rzp_id": rzp_oid,
                                 "total": total,
                                 "items": cart_items,
-                                "customer": name
+                                "customer": name,
+                                "pickup": pickup
                             }
                             st.rerun()
 
@@ -300,6 +329,7 @@ def main():
                 st.subheader("🧾 Order Summary")
                 st.write(f"**Customer:** {customer_name}")
                 st.write(f"**Order ID:** {details['oid']}")
+                st.write(f"**Estimated Pickup:** {details.get('pickup', '-')}")
                 st.divider()
                 for item in details['items']:
                     st.write(f"• {item['qty']}x {item['name']} ({item['size']}) - ₹{item['line_total']}")
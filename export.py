@@ -0,0 +1,252 @@
+# export.py
+import argparse
+import csv
+import gzip
+import importlib.util
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from itertools import groupby
+
+DB_PATH = "coffee.db"
+CHUNK_SIZE = 5000
+# --bench fails if the 1M-order export peaks more than this above the 100k one
+BENCH_TOLERANCE_MB = 5
+FORMATS = ("csv", "jsonl", "parquet")
+
+EXPORT_COLUMNS = [
+    "order_id", "customer_name", "srn", "status", "total", "created_at",
+    "completion_code", "is_scheduled", "scheduled_for", "razorpay_order_id", "items",
+]
+
+
+def get_connection(db_path=DB_PATH):
+    return sqlite3.connect(db_path, check_same_thread=False)
+
+
+def build_query(statuses=None, date_from=None, date_to=None):
+    # date_from / date_to are "YYYY-MM-DD" strings, compared against created_at.
+    # statuses=None means any status; an empty list matches nothing.
+    where = []
+    params = []
+    if statuses is not None:
+        where.append(f"o.status IN ({','.join(['?'] * len(statuses))})")
+        params.extend(statuses)
+    if date_from:
+        where.append("o.created_at >= ?")
+        params.append(f"{date_from} 00:00:00")
+    if date_to:
+        where.append("o.created_at <= ?")
+        params.append(f"{date_to} 23:59:59")
+
+    q = f"""
+        SELECT o.order_id, o.customer_name, o.srn, o.status, o.total, o.created_at,
+               o.completion_code, o.is_scheduled, o.scheduled_for, o.razorpay_order_id,
+               i.qty, i.drink_name, i.size, i.addons
+        FROM orders o
+        LEFT JOIN order_items i ON i.order_id = o.order_id
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY o.created_at, o.order_id, i.id
+    """
+    return q, params
+
+
+def iter_orders(conn, statuses=None, date_from=None, date_to=None, chunk_size=CHUNK_SIZE):
+    """Yield one dict per order, reading the joined rows in chunks of chunk_size."""
+    q, params = build_query(statuses, date_from, date_to)
+    cur = conn.cursor()
+    cur.execute(q, params)
+
+    def rows():
+        while True:
+            chunk = cur.fetchmany(chunk_size)
+            if not chunk:
+                return
+            yield from chunk
+
+    # Rows are ordered by order, so each order's items are consecutive
+    for _, group in groupby(rows(), key=lambda r: r[0]):
+        item_lines = []
+        for r in group:
+            if r[10] is not None:
+                item_lines.append(f"{r[10]}x {r[11]} ({r[12]}) [{r[13]}]")
+        order = dict(zip(EXPORT_COLUMNS[:10], r[:10]))
+        order["items"] = "\n".join(item_lines)
+        yield order
+
+
+def write_csv(orders, fh):
+    writer = csv.DictWriter(fh, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    count = 0
+    for order in orders:
+        writer.writerow(order)
+        count += 1
+    return count
+
+
+def write_jsonl(orders, fh):
+    count = 0
+    for order in orders:
+        fh.write(json.dumps(order, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def write_parquet(orders, path, chunk_size=CHUNK_SIZE):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        ("order_id", pa.string()),
+        ("customer_name", pa.string()),
+        ("srn", pa.string()),
+        ("status", pa.string()),
+        ("total", pa.int64()),
+        ("created_at", pa.string()),
+        ("completion_code", pa.string()),
+        ("is_scheduled", pa.int64()),
+        ("scheduled_for", pa.string()),
+        ("razorpay_order_id", pa.string()),
+        ("items", pa.string()),
+    ])
+
+    count = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        batch = []
+        for order in orders:
+            batch.append(order)
+            if len(batch) >= chunk_size:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def export_orders(path, fmt="csv", statuses=None, date_from=None, date_to=None,
+                  db_path=DB_PATH, chunk_size=CHUNK_SIZE):
+    """Stream matching orders to path. CSV / JSONL are gzipped when path ends in .gz.
+    Returns the number of orders written."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    conn = get_connection(db_path)
+    try:
+        orders = iter_orders(conn, statuses, date_from, date_to, chunk_size)
+        if fmt == "parquet":
+            return write_parquet(orders, path, chunk_size)
+
+        if str(path).endswith(".gz"):
+            fh = gzip.open(path, "wt", encoding="utf-8", newline="")
+        else:
+            fh = open(path, "w", encoding="utf-8", newline="")
+        with fh:
+            if fmt == "csv":
+                return write_csv(orders, fh)
+            return write_jsonl(orders, fh)
+    finally:
+        conn.close()
+
+
+def build_bench_db(path, n_orders):
+    """Synthetic DB with n_orders orders and one item each, in the app's schema."""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE orders (
+            order_id TEXT PRIMARY KEY, customer_name TEXT, srn TEXT, status TEXT, total INTEGER,
+            created_at TEXT, completion_code TEXT, is_scheduled INTEGER, scheduled_for TEXT,
+            razorpay_order_id TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, order_id TEXT, drink_name TEXT, size TEXT,
+            qty INTEGER, addons TEXT, line_total INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX idx_order_items_order_id ON order_items(order_id)")
+    conn.executemany(
+        "INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((f"o{i:08d}", "Customer", f"SRN{i % 5000:05d}", "completed", 45,
+          f"2026-{1 + i % 12:02d}-10 10:00:00", "1234", 0, f"2026-{1 + i % 12:02d}-10 10:00:00", "rzp")
+         for i in range(n_orders)),
+    )
+    conn.executemany(
+        "INSERT INTO order_items (order_id, drink_name, size, qty, addons, line_total) VALUES (?, ?, ?, ?, ?, ?)",
+        ((f"o{i:08d}", "Cappuccino", "Regular", 1, "None", 45) for i in range(n_orders)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def bench(sizes=(100_000, 1_000_000), fmt="csv", tolerance_mb=BENCH_TOLERANCE_MB):
+    """Export synthetic DBs of each size in a fresh process and report its peak RSS.
+    Raises RuntimeError if the largest export peaks more than tolerance_mb above the smallest."""
+    peaks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            db = os.path.join(tmp, f"bench_{n}.db")
+            build_bench_db(db, n)
+            out = os.path.join(tmp, f"bench_{n}.{fmt}.gz")
+            # A child per size, so ru_maxrss isn't carried over from the previous run
+            proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), out,
+                                     "--format", fmt, "--db", db], stdout=subprocess.DEVNULL)
+            _, status, usage = os.wait4(proc.pid, 0)
+            if status != 0:
+                raise RuntimeError(f"Export of {n} orders failed")
+            # ru_maxrss is KB on Linux, bytes on macOS
+            peak_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+            print(f"{n:>10} orders  peak RSS {peak_mb:6.1f} MB")
+            peaks.append(peak_mb)
+            os.remove(db)
+            os.remove(out)
+
+    growth = peaks[-1] - peaks[0]
+    if growth > tolerance_mb:
+        raise RuntimeError(f"Peak RSS grew {growth:.1f} MB from {sizes[0]} to {sizes[-1]} orders "
+                           f"(allowed {tolerance_mb} MB); export is no longer streaming")
+    print(f"OK: peak RSS grew {growth:.1f} MB (allowed {tolerance_mb} MB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export orders without loading them all into memory.")
+    parser.add_argument("output", nargs="?", help="Output file (add .gz for compressed CSV / JSONL)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--status", action="append", help="Status to include (repeatable)")
+    parser.add_argument("--from", dest="date_from", help="Start date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", help="End date, YYYY-MM-DD")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--bench", action="store_true",
+                        help="Check peak memory stays flat exporting synthetic 100k and 1M order DBs")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        try:
+            bench(fmt=args.format)
+        except RuntimeError as e:
+            sys.exit(f"FAIL: {e}")
+        return
+    if not args.output:
+        parser.error("output is required")
+
+    count = export_orders(args.output, args.format, args.status, args.date_from,
+                          args.date_to, args.db, args.chunk_size)
+    print(f"Exported {count} orders to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,16 @@ import streamlit as st
 import sqlite3
 import pandas as pd
 import time
+import os
+import tempfile
+from export import export_orders, parquet_available
+from admission import get_controller
 
 # --- CONFIG ---
 DB_PATH = "coffee.db"
 ADMIN_USER = "admin"
 ADMIN_PASS = "admin123"
+ADMIN_EXPORT_MAX_BYTES = 20 * 1024 * 1024
 
 st.set_page_config(page_title="CCD Admin", page_icon="🔒", layout="wide")
 
@@ -44,12 +49,26 @@ def get_orders_data(status_list, sort_asc=True):
     conn.close()
     return full_data
 
-def update_status(order_id, new_status):
+def get_status_options():
     conn = get_connection()
     c = conn.cursor()
-    c.execute("UPDATE orders SET status = ? WHERE order_id = ?", (new_status, order_id))
+    c.execute("SELECT DISTINCT status FROM orders WHERE status IS NOT NULL ORDER BY status")
+    rows = c.fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+def update_status(order_id, old_status, new_status):
+    conn = get_connection()
+    c = conn.cursor()
+    # Only moves the order if nobody else has moved it since this page loaded
+    c.execute("UPDATE orders SET status = ? WHERE order_id = ? AND status = ?", (new_status, order_id, old_status))
+    updated = c.rowcount == 1
     conn.commit()
     conn.close()
+    # Keep the kiosk admission counter of pending/preparing orders in step
+    if updated:
+        get_controller(DB_PATH).on_status_change(order_id, old_status, new_status)
+    return updated
 
 # --- AUTH ---
 if "admin_logged_in" not in st.session_state:
@@ -126,13 +145,13 @@ else:
                     if status == "pending":
                         # Button: Pending -> Preparing
                         if st.button("⏳ Pending", key=f"btn_{oid}", help="Click to start preparing"):
-                            update_status(oid, "preparing")
+                            update_status(oid, status, "preparing")
                             st.rerun()
                             
                     elif status == "preparing":
                         # Button: Preparing -> Ready (Blue)
                         if st.button("👨‍🍳 Preparing", key=f"btn_{oid}", type="primary", help="Click when ready"):
-                            update_status(oid, "ready")
+                            update_status(oid, status, "ready")
                             st.rerun()
                             
                     elif status == "ready":
@@ -143,7 +162,7 @@ else:
                             code_input = st.text_input("Enter Customer Code", key=f"code_{oid}")
                             if st.button("Confirm Pickup", key=f"confirm_{oid}"):
                                 if str(code_input).strip() == str(order['code']):
-                                    update_status(oid, "completed")
+                                    update_status(oid, status, "completed")
                                     st.success("Completed!")
                                     time.sleep(0.5)
                                     st.rerun()
@@ -171,4 +190,53 @@ else:
                 column_config={"items": st.column_config.TextColumn("Items", width="large")}
             )
         else:
-            st.info("No history found.")
\ No newline at end of file
+            st.info("No history found.")
+
+        # --- EXPORT ---
+        # The export streams from SQLite to a temp file, but st.download_button holds the finished
+        # file in memory for the session, so downloads here are capped at ADMIN_EXPORT_MAX_BYTES.
+        # Bigger ranges go through the command line: python export.py
+        with st.expander("⬇️ Export Orders"):
+            e1, e2, e3 = st.columns(3)
+            date_from = e1.date_input("From", value=None)
+            date_to = e2.date_input("To", value=None)
+            fmt = e3.selectbox("Format", ["csv.gz", "jsonl.gz"] + (["parquet"] if parquet_available() else []))
+            status_options = get_status_options()
+            statuses = st.multiselect(
+                "Status",
+                status_options,
+                default=[s for s in ["completed"] if s in status_options],
+            )
+
+            # The file only lives for this run: it's handed to the download button once and deleted,
+            # so nothing is left in the temp dir and later reruns don't re-read it
+            if st.button("Prepare Export"):
+                if not statuses:
+                    st.warning("Select at least one status to export.")
+                else:
+                    tmp = tempfile.NamedTemporaryFile(suffix=f".{fmt}", delete=False)
+                    tmp.close()
+                    try:
+                        count = export_orders(
+                            tmp.name,
+                            fmt.split(".")[0],
+                            statuses,
+                            date_from.isoformat() if date_from else None,
+                            date_to.isoformat() if date_to else None,
+                            db_path=DB_PATH,
+                        )
+                        size = os.path.getsize(tmp.name)
+                        if size > ADMIN_EXPORT_MAX_BYTES:
+                            st.warning(
+                                f"{count} orders is {size // (1024 * 1024)} MB, over the "
+                                f"{ADMIN_EXPORT_MAX_BYTES // (1024 * 1024)} MB download limit. Narrow the "
+                                "date range or run `python export.py` on the server."
+                            )
+                        else:
+                            st.caption(f"{count} orders ready.")
+                            with open(tmp.name, "rb") as fh:
+                                st.download_button("Download", fh, file_name=f"orders.{fmt}")
+                    except Exception as e:
+                        st.error(f"Export failed: {e}")
+                    finally:
+                        os.remove(tmp.name)